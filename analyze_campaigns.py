@@ -1,34 +1,117 @@
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # figures are only saved to disk, also from worker processes
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+CSV_ENGINE = "pyarrow" if HAS_PYARROW else "c"
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 sns.set(style="whitegrid")
 
-def load_and_clean_data(filepath):
-    print(f"Loading data from {filepath}...")
-    df = pd.read_csv(filepath)
+# Declared up front so the CSV parser doesn't have to infer them
+CSV_DTYPES = {
+    'Campaign ID': 'str',
+    'Impressions': 'float64',
+    'Clicks': 'float64',
+    'Conversions': 'float64',
+    'Spend': 'float64',
+    'Revenue': 'float64'
+}
+
+# Caps for the conversion-rate scatter plot; metrics always use every row
+SCATTER_MAX_POINTS = 20000
+SCATTER_TOP_CAMPAIGNS = 20
+
+# Columns the analysis uses; anything else in the CSV is never parsed
+COLUMNS = ['Campaign ID', 'Date', 'Impressions', 'Clicks', 'Conversions', 'Spend', 'Revenue']
+
+# Part of the cache file name; bump it whenever the cleaning steps or the
+# cached columns/dtypes change so caches written by older code are ignored
+CACHE_VERSION = 3
+
+def load_with_polars(filepath):
+    # Lazy scan so parsing, null handling and filtering run as one multi-threaded pass
+    lf = (
+        pl.scan_csv(filepath, try_parse_dates=True)
+        .select(COLUMNS)
+        .drop_nulls(['Clicks', 'Spend'])
+        .filter(pl.col('Spend') > 0)
+    )
+    return lf.collect(engine="streaming").to_pandas()
+
+def load_and_clean_data(filepath, engine="pandas"):
+    # Re-use the cleaned data from a previous run unless the CSV is newer
+    cache_path = f"{os.path.splitext(filepath)[0]}.v{CACHE_VERSION}.parquet"
+    if HAS_PYARROW and os.path.exists(cache_path) and os.path.getmtime(cache_path) > os.path.getmtime(filepath):
+        print(f"Loading cached data from {cache_path} (already cleaned; CSV parsing and --engine are skipped)...")
+        return pd.read_parquet(cache_path, engine="pyarrow", columns=COLUMNS)
     
-    # 1. Handle missing values
-    df.dropna(subset=['Clicks', 'Spend'], inplace=True)
+    print(f"Loading data from {filepath}...")
+    if engine == "polars":
+        df = load_with_polars(filepath)
+    else:
+        df = pd.read_csv(filepath, engine=CSV_ENGINE, usecols=COLUMNS, dtype=CSV_DTYPES, parse_dates=['Date'])
+        
+        # 1. Handle missing values
+        df.dropna(subset=['Clicks', 'Spend'], inplace=True)
+        
+        # 2. Ensure non-negative/zero spend
+        df = df[df['Spend'] > 0]
     
-    # 2. Ensure non-negative/zero spend
-    df = df[df['Spend'] > 0]
+    # Narrow the numeric columns and factorize the group keys once; every later
+    # sum and group reduction then reads half the bytes and integer codes
+    # (counts are read as float so blank cells parse; a count column that still
+    # has blanks stays float, the rest become the smallest integer type)
+    for col in ('Impressions', 'Clicks', 'Conversions'):
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    for col in ('Spend', 'Revenue'):
+        df[col] = pd.to_numeric(df[col], downcast='float')
+    df['Campaign ID'] = df['Campaign ID'].astype('category')
     
-    df['Date'] = pd.to_datetime(df['Date'])
+    if HAS_PYARROW:
+        df.to_parquet(cache_path, engine="pyarrow", compression="zstd", index=False)
     
     return df
 
+def write_metrics(metrics, path):
+    # Serialize in one go and write once; closing the file flushes the buffer
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(metrics))
+    else:
+        with open(path, 'w') as f:
+            json.dump(metrics, f, separators=(',', ':'))
+
 def calculate_metrics(df):
     print("\n--- Marketing Campaign Metrics ---")
     
-    # Overall Metrics
+    # Overall Metrics (float32 columns are accumulated in float64, skipping NaN like .sum())
     total_impressions = df['Impressions'].sum()
     total_clicks = df['Clicks'].sum()
     total_conversions = df['Conversions'].sum()
-    total_spend = df['Spend'].sum()
-    total_revenue = df['Revenue'].sum()
+    total_spend = np.nansum(df['Spend'].to_numpy(), dtype=np.float64)
+    total_revenue = np.nansum(df['Revenue'].to_numpy(), dtype=np.float64)
     
     ctr = (total_clicks / total_impressions) * 100
     conversion_rate = (total_conversions / total_clicks) * 100
@@ -38,11 +121,19 @@ def calculate_metrics(df):
     
     # --- New Metrics ---
     
-    # Campaign Performance
-    campaign_stats = df.groupby('Campaign ID').agg({
-        'Spend': 'sum',
-        'Revenue': 'sum'
-    }).reset_index()
+    # Campaign Performance (group sums via bincount over the factorized IDs)
+    # Like groupby().sum(): rows without a campaign (code -1) are left out and
+    # missing amounts count as 0
+    codes, campaign_ids = pd.factorize(df['Campaign ID'], sort=True)
+    has_campaign = codes >= 0
+    codes = codes[has_campaign]
+    campaign_stats = pd.DataFrame({
+        'Campaign ID': campaign_ids,
+        'Spend': np.bincount(codes, weights=np.nan_to_num(df['Spend'].to_numpy()[has_campaign]),
+                             minlength=len(campaign_ids)),
+        'Revenue': np.bincount(codes, weights=np.nan_to_num(df['Revenue'].to_numpy()[has_campaign]),
+                               minlength=len(campaign_ids))
+    })
     campaign_stats['ROI'] = ((campaign_stats['Revenue'] - campaign_stats['Spend']) / campaign_stats['Spend']) * 100
     
     top_campaign = campaign_stats.loc[campaign_stats['ROI'].idxmax()]
@@ -63,75 +154,129 @@ def calculate_metrics(df):
         'Bottom Campaign ROI': float(bottom_campaign['ROI'])
     }
     
-    with open('campaign_metrics.json', 'w') as f:
-        json.dump(metrics, f, indent=4)
+    write_metrics(metrics, 'campaign_metrics.json')
         
-    return metrics
+    return metrics, campaign_stats
 
-def generate_visualizations(df):
-    print("\nGenerating Visualizations...")
-    
-    # 1. ROI by Campaign
-    campaign_metrics = df.groupby('Campaign ID').agg({
-        'Spend': 'sum',
-        'Revenue': 'sum'
-    }).reset_index()
-    campaign_metrics['ROI'] = ((campaign_metrics['Revenue'] - campaign_metrics['Spend']) / campaign_metrics['Spend']) * 100
-    
+# Each renderer runs in a worker process and receives only pre-aggregated
+# arrays (the scatter gets at most SCATTER_MAX_POINTS rows)
+def render_campaign_roi(data, output_path):
     plt.figure(figsize=(12, 6))
-    sns.barplot(data=campaign_metrics, x='Campaign ID', y='ROI', palette='coolwarm')
+    plt.bar(data['Campaign ID'], data['ROI'], color=sns.color_palette('coolwarm', len(data['ROI'])))
     plt.xticks(rotation=45)
+    plt.grid(False, axis='x')
+    plt.xlabel('Campaign ID')
+    plt.ylabel('ROI')
     plt.title('ROI by Campaign')
     plt.tight_layout()
-    plt.savefig('viz_campaign_roi.png')
+    plt.savefig(output_path)
     plt.close()
-    
-    # 2. Conversion Rate vs Spend
-    df['Daily_Conv_Rate'] = (df['Conversions'] / df['Clicks']) * 100
+
+def render_conv_rate_vs_spend(data, output_path):
     plt.figure(figsize=(10, 6))
-    sns.scatterplot(data=df, x='Spend', y='Daily_Conv_Rate', hue='Campaign ID', alpha=0.6)
+    ax = sns.scatterplot(x=data['Spend'], y=data['Daily_Conv_Rate'], hue=data['Campaign ID'], alpha=0.6)
+    ax.get_legend().set_title('Campaign ID')
+    plt.xlabel('Spend')
+    plt.ylabel('Daily_Conv_Rate')
     plt.title('Daily Conversion Rate vs Spend')
     plt.tight_layout()
-    plt.savefig('viz_conv_rate_vs_spend.png')
+    plt.savefig(output_path)
     plt.close()
-    
-    # 3. Monthly Impressions Trend
-    df['Month'] = df['Date'].dt.to_period('M')
-    monthly_impressions = df.groupby('Month')['Impressions'].sum().reset_index()
-    monthly_impressions['Month'] = monthly_impressions['Month'].astype(str)
-    
+
+def render_impressions_trend(data, output_path):
     plt.figure(figsize=(12, 6))
-    sns.lineplot(data=monthly_impressions, x='Month', y='Impressions', marker='o')
+    plt.plot(data['Month'], data['Impressions'], marker='o')
     plt.xticks(rotation=45)
+    plt.xlabel('Month')
+    plt.ylabel('Impressions')
     plt.title('Monthly Impressions Trend')
     plt.tight_layout()
-    plt.savefig('viz_impressions_trend.png')
+    plt.savefig(output_path)
+    plt.close()
+
+def render_ctr_trend(data, output_path):
+    plt.figure(figsize=(12, 6))
+    plt.plot(data['Month'], data['CTR'], marker='o', color='purple')
+    plt.xticks(rotation=45)
+    plt.xlabel('Month')
+    plt.ylabel('CTR')
+    plt.title('Monthly Click-Through Rate (CTR) Trend')
+    plt.tight_layout()
+    plt.savefig(output_path)
     plt.close()
+
+def generate_visualizations(df, campaign_stats):
+    print("\nGenerating Visualizations...")
+    
+    # Aggregate everything here, then render the independent charts in parallel
+    charts = []
+    
+    # 1. ROI by Campaign (per-campaign aggregates come from calculate_metrics)
+    charts.append((render_campaign_roi, {
+        'Campaign ID': campaign_stats['Campaign ID'].astype(str).to_numpy(),
+        'ROI': campaign_stats['ROI'].to_numpy()
+    }, 'viz_campaign_roi.png'))
+    
+    # 2. Conversion Rate vs Spend
+    # Limit to the top campaigns by spend and a random sample of their rows
+    top_campaigns = campaign_stats.nlargest(SCATTER_TOP_CAMPAIGNS, 'Spend')['Campaign ID']
+    plot_df = df[df['Campaign ID'].isin(top_campaigns)]
+    if len(plot_df) > SCATTER_MAX_POINTS:
+        plot_df = plot_df.sample(n=SCATTER_MAX_POINTS, random_state=0)
+    
+    # Computed as a temporary array rather than added as a column on df
+    conv_rate = (plot_df['Conversions'].to_numpy() / plot_df['Clicks'].to_numpy()) * 100.0
+    charts.append((render_conv_rate_vs_spend, {
+        'Spend': plot_df['Spend'].to_numpy(),
+        'Daily_Conv_Rate': conv_rate,
+        'Campaign ID': plot_df['Campaign ID'].cat.remove_unused_categories().array
+    }, 'viz_conv_rate_vs_spend.png'))
+    
+    # 3. Monthly Impressions Trend
+    # Month buckets are kept local (df is not modified): truncate to
+    # datetime64[M] and group on its integer months-since-epoch view. Rows
+    # without a date are left out, as the Period groupby did (NaT's integer
+    # view would otherwise become a real key)
+    months = df['Date'].to_numpy().astype('datetime64[M]')
+    has_date = ~np.isnat(months)
+    month_codes, month_keys = pd.factorize(months[has_date].view('i8'), sort=True)
+    month_labels = np.datetime_as_string(month_keys.astype('datetime64[M]'), unit='M')
+    # Blank counts add nothing to their month, as groupby().sum() did
+    monthly_impressions = np.bincount(month_codes, weights=np.nan_to_num(df['Impressions'].to_numpy()[has_date]))
+    monthly_clicks = np.bincount(month_codes, weights=np.nan_to_num(df['Clicks'].to_numpy()[has_date]))
+    
+    charts.append((render_impressions_trend, {
+        'Month': month_labels,
+        'Impressions': monthly_impressions
+    }, 'viz_impressions_trend.png'))
     
     # --- New Visualizations ---
     
     # 4. CTR Trend Over Time
     # Aggregate by month for smoother line
-    monthly_ctr = df.groupby('Month').agg({
-        'Clicks': 'sum',
-        'Impressions': 'sum'
-    }).reset_index()
-    monthly_ctr['CTR'] = (monthly_ctr['Clicks'] / monthly_ctr['Impressions']) * 100
-    monthly_ctr['Month'] = monthly_ctr['Month'].astype(str)
+    charts.append((render_ctr_trend, {
+        'Month': month_labels,
+        'CTR': (monthly_clicks / monthly_impressions) * 100
+    }, 'viz_ctr_trend.png'))
     
-    plt.figure(figsize=(12, 6))
-    sns.lineplot(data=monthly_ctr, x='Month', y='CTR', marker='o', color='purple')
-    plt.xticks(rotation=45)
-    plt.title('Monthly Click-Through Rate (CTR) Trend')
-    plt.tight_layout()
-    plt.savefig('viz_ctr_trend.png')
-    plt.close()
+    with ProcessPoolExecutor(max_workers=min(len(charts), os.cpu_count() or 1)) as executor:
+        futures = [executor.submit(render, data, output_path) for render, data, output_path in charts]
+        for future in futures:
+            future.result()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Marketing campaign analysis")
+    parser.add_argument('--engine', choices=['pandas', 'polars'], default='pandas',
+                        help="Library used to load and clean the CSV (unused when a "
+                             "cleaned Parquet cache newer than the CSV exists)")
+    args = parser.parse_args()
+    if args.engine == 'polars' and pl is None:
+        parser.error("--engine polars requires the polars package")
+    
     if not os.path.exists('marketing_campaigns.csv'):
         print("Data file not found. Please run generate_data.py first.")
     else:
-        df = load_and_clean_data('marketing_campaigns.csv')
-        metrics = calculate_metrics(df)
-        generate_visualizations(df)
+        df = load_and_clean_data('marketing_campaigns.csv', engine=args.engine)
+        metrics, campaign_stats = calculate_metrics(df)
+        generate_visualizations(df, campaign_stats)
         print("\nCampaign Analysis Complete. Visualizations saved.")
@@ -1,71 +1,160 @@
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # figures are only saved to disk, also from worker processes
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+CSV_ENGINE = "pyarrow" if HAS_PYARROW else "c"
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Set style
 sns.set(style="whitegrid")
 
-def load_and_clean_data(filepath):
-    print(f"Loading data from {filepath}...")
-    df = pd.read_csv(filepath)
-    
-    # 1. Remove duplicates
-    initial_len = len(df)
-    df.drop_duplicates(inplace=True)
-    print(f"Removed {initial_len - len(df)} duplicate rows.")
+# Declared up front so the CSV parser doesn't have to infer them
+CSV_DTYPES = {
+    'Customer ID': 'str',
+    'Order Amount': 'float64',
+    'Category': 'str'
+}
+
+# Columns the analysis uses; anything else in the CSV is never parsed
+COLUMNS = ['Customer ID', 'Order Date', 'Order Amount', 'Category']
+
+# A transaction is identified by who ordered, when, and for how much
+DEDUP_KEYS = ['Customer ID', 'Order Date', 'Order Amount']
+
+# Part of the cache file name; bump it whenever the cleaning steps or the
+# cached columns/dtypes change so caches written by older code are ignored
+CACHE_VERSION = 3
+
+def load_with_polars(filepath):
+    # Lazy scan so dedup, null handling and filtering run as one multi-threaded pass
+    raw = pl.scan_csv(filepath, try_parse_dates=True).select(COLUMNS)
+    deduped = raw.unique(subset=DEDUP_KEYS, keep='first', maintain_order=True)
+    cleaned = (
+        deduped
+        .drop_nulls(['Order Amount', 'Customer ID'])
+        .filter(pl.col('Order Amount') > 0)
+    )
+    initial_len, deduped_len, df = pl.collect_all(
+        [raw.select(pl.len()), deduped.select(pl.len()), cleaned], engine="streaming"
+    )
+    print(f"Removed {initial_len.item() - deduped_len.item()} duplicate rows.")
+    return df.to_pandas()
+
+def load_and_clean_data(filepath, engine="pandas"):
+    # Re-use the cleaned data from a previous run unless the CSV is newer
+    cache_path = f"{os.path.splitext(filepath)[0]}.v{CACHE_VERSION}.parquet"
+    if HAS_PYARROW and os.path.exists(cache_path) and os.path.getmtime(cache_path) > os.path.getmtime(filepath):
+        print(f"Loading cached data from {cache_path} (already cleaned; CSV parsing and --engine are skipped)...")
+        return pd.read_parquet(cache_path, engine="pyarrow", columns=COLUMNS)
     
-    # 2. Handle missing values
-    df.dropna(subset=['Order Amount', 'Customer ID'], inplace=True)
+    print(f"Loading data from {filepath}...")
+    if engine == "polars":
+        df = load_with_polars(filepath)
+    else:
+        df = pd.read_csv(filepath, engine=CSV_ENGINE, usecols=COLUMNS, dtype=CSV_DTYPES,
+                         parse_dates=['Order Date'])
+        
+        # 1. Remove duplicates (hashing only the key columns, not whole rows)
+        initial_len = len(df)
+        df.drop_duplicates(subset=DEDUP_KEYS, inplace=True)
+        print(f"Removed {initial_len - len(df)} duplicate rows.")
+        
+        # 2. Handle missing values
+        df.dropna(subset=['Order Amount', 'Customer ID'], inplace=True)
+        
+        # 3. Filter invalid amounts
+        df = df[df['Order Amount'] > 0]
     
-    # 3. Filter invalid amounts
-    df = df[df['Order Amount'] > 0]
+    # Narrow the amount column and factorize the group keys once; every later
+    # sum and group reduction then reads half the bytes and integer codes
+    df['Order Amount'] = pd.to_numeric(df['Order Amount'], downcast='float')
+    df['Customer ID'] = df['Customer ID'].astype('category')
+    df['Category'] = df['Category'].astype('category')
     
-    # Convert dates
-    df['Order Date'] = pd.to_datetime(df['Order Date'])
-    df['Signup Date'] = pd.to_datetime(df['Signup Date'])
+    if HAS_PYARROW:
+        df.to_parquet(cache_path, engine="pyarrow", compression="zstd", index=False)
     
     return df
 
+def write_metrics(metrics, path):
+    # Serialize in one go and write once; closing the file flushes the buffer
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(metrics))
+    else:
+        with open(path, 'w') as f:
+            json.dump(metrics, f, separators=(',', ':'))
+
 def calculate_metrics(df):
     print("\n--- Customer Metrics ---")
     
+    # Factorize customers once; per-customer counts and sums are bincounts over these codes
+    customer_codes, _ = pd.factorize(df['Customer ID'])
+    order_counts = np.bincount(customer_codes)
+    
     # Active Customers
-    active_customers = df['Customer ID'].nunique()
+    active_customers = order_counts.size
     
     # Buying Frequency
     buying_freq = len(df) / active_customers
     
-    # Revenue Contribution
-    total_revenue = df['Order Amount'].sum()
+    # Revenue Contribution (float32 column, accumulated in float64, skipping NaN like .sum())
+    total_revenue = np.nansum(df['Order Amount'].to_numpy(), dtype=np.float64)
     
     # Retention (Customers with > 1 order)
-    order_counts = df.groupby('Customer ID').size()
-    retained_customers = order_counts[order_counts > 1].count()
+    retained_customers = (order_counts > 1).sum()
     retention_rate = (retained_customers / active_customers) * 100
     
     # --- New Metrics ---
     
     # Churn Rate (Inactive > 180 days)
-    last_order_date = df.groupby('Customer ID')['Order Date'].max()
+    # Sort orders by customer so each customer is one contiguous run, then take
+    # the max of every run in a single pass over the raw int64 timestamps
+    order = np.argsort(customer_codes, kind='stable')
+    sorted_dates = df['Order Date'].to_numpy()[order]
+    run_starts = np.concatenate(([0], np.cumsum(order_counts)[:-1]))
+    last_order_date = np.maximum.reduceat(sorted_dates.view('i8'), run_starts).view(sorted_dates.dtype)
     # Assume "current date" is the max date in the dataset + 1 day
     current_date = df['Order Date'].max()
-    days_inactive = (current_date - last_order_date).dt.days
-    churned_customers = days_inactive[days_inactive > 180].count()
+    # Compare against a single cutoff date instead of materializing days inactive
+    threshold = current_date - pd.Timedelta(days=180)
+    churned_customers = (last_order_date < threshold.to_datetime64()).sum()
     churn_rate = (churned_customers / active_customers) * 100
     print(f"Churn Rate (Inactive > 180 days): {churn_rate:.2f}%")
     
     # Customer Segmentation (RFM-like: based on Revenue)
-    customer_revenue = df.groupby('Customer ID')['Order Amount'].sum()
+    customer_revenue = np.sort(np.bincount(customer_codes, weights=df['Order Amount'].to_numpy()))
     # Simple segmentation: Top 20% = High Value, Next 30% = Medium, Bottom 50% = Low
-    high_cutoff = customer_revenue.quantile(0.8)
-    med_cutoff = customer_revenue.quantile(0.5)
+    med_cutoff, high_cutoff = np.quantile(customer_revenue, [0.5, 0.8])
     
-    high_value_count = customer_revenue[customer_revenue >= high_cutoff].count()
-    med_value_count = customer_revenue[(customer_revenue < high_cutoff) & (customer_revenue >= med_cutoff)].count()
-    low_value_count = customer_revenue[customer_revenue < med_cutoff].count()
+    # Revenue is sorted, so the segment boundaries are just insertion points
+    med_idx, high_idx = np.searchsorted(customer_revenue, [med_cutoff, high_cutoff])
+    high_value_count = customer_revenue.size - high_idx
+    med_value_count = high_idx - med_idx
+    low_value_count = med_idx
     
     print(f"High Value Customers (> ${high_cutoff:.2f}): {high_value_count}")
     
@@ -81,82 +170,132 @@ def calculate_metrics(df):
         'Low Value Count': int(low_value_count)
     }
     
-    with open('customer_metrics.json', 'w') as f:
-        json.dump(metrics, f, indent=4)
+    write_metrics(metrics, 'customer_metrics.json')
         
     return metrics
 
-def generate_visualizations(df):
-    print("\nGenerating Visualizations...")
-    
-    # 1. Revenue over time (Monthly)
-    df['Month'] = df['Order Date'].dt.to_period('M')
-    monthly_revenue = df.groupby('Month')['Order Amount'].sum().reset_index()
-    monthly_revenue['Month'] = monthly_revenue['Month'].astype(str)
-    
+# Each renderer runs in a worker process and receives pre-aggregated arrays,
+# except the histogram, which ships the raw amounts because the KDE needs them
+def render_revenue_over_time(data, output_path):
     plt.figure(figsize=(12, 6))
-    sns.lineplot(data=monthly_revenue, x='Month', y='Order Amount', marker='o')
+    plt.plot(data['Month'], data['Order Amount'], marker='o')
     plt.xticks(rotation=45)
+    plt.xlabel('Month')
+    plt.ylabel('Order Amount')
     plt.title('Monthly Revenue Trend')
     plt.tight_layout()
-    plt.savefig('viz_revenue_over_time.png')
+    plt.savefig(output_path)
     plt.close()
-    
-    # 2. Top Product Categories
+
+def render_category_revenue(data, output_path):
     plt.figure(figsize=(10, 6))
-    category_revenue = df.groupby('Category')['Order Amount'].sum().sort_values(ascending=False).reset_index()
-    sns.barplot(data=category_revenue, x='Category', y='Order Amount')
+    plt.bar(data['Category'], data['Order Amount'])
+    plt.grid(False, axis='x')
+    plt.xlabel('Category')
+    plt.ylabel('Order Amount')
     plt.title('Revenue by Product Category')
     plt.tight_layout()
-    plt.savefig('viz_category_revenue.png')
+    plt.savefig(output_path)
     plt.close()
-    
-    # 3. Order Amount Distribution
+
+def render_order_distribution(data, output_path):
     plt.figure(figsize=(10, 6))
-    sns.histplot(df['Order Amount'], bins=50, kde=True)
+    sns.histplot(data['Order Amount'], bins=50, kde=True)
+    plt.xlabel('Order Amount')
     plt.title('Order Amount Distribution')
     plt.tight_layout()
-    plt.savefig('viz_order_distribution.png')
+    plt.savefig(output_path)
     plt.close()
-    
-    # --- New Visualizations ---
-    
-    # 4. Sales by Day of Week
-    df['DayOfWeek'] = df['Order Date'].dt.day_name()
-    # Order days correctly
-    days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    day_counts = df['DayOfWeek'].value_counts().reindex(days_order).reset_index()
-    day_counts.columns = ['Day', 'Orders']
-    
+
+def render_day_of_week(data, output_path):
     plt.figure(figsize=(10, 6))
-    sns.barplot(data=day_counts, x='Day', y='Orders', palette='viridis')
+    plt.bar(data['Day'], data['Orders'], color=sns.color_palette('viridis', len(data['Day'])))
+    plt.grid(False, axis='x')
+    plt.xlabel('Day')
+    plt.ylabel('Orders')
     plt.title('Orders by Day of Week')
     plt.tight_layout()
-    plt.savefig('viz_day_of_week.png')
+    plt.savefig(output_path)
     plt.close()
-    
-    # 5. Customer Segments (Pie Chart)
-    # Re-calculate for viz
-    customer_revenue = df.groupby('Customer ID')['Order Amount'].sum()
-    high_cutoff = customer_revenue.quantile(0.8)
-    med_cutoff = customer_revenue.quantile(0.5)
-    
-    high = customer_revenue[customer_revenue >= high_cutoff].count()
-    med = customer_revenue[(customer_revenue < high_cutoff) & (customer_revenue >= med_cutoff)].count()
-    low = customer_revenue[customer_revenue < med_cutoff].count()
-    
+
+def render_customer_segments(data, output_path):
     plt.figure(figsize=(8, 8))
-    plt.pie([high, med, low], labels=['High Value', 'Medium Value', 'Low Value'], autopct='%1.1f%%', colors=['#ff9999','#66b3ff','#99ff99'])
+    plt.pie(data['Counts'], labels=data['Labels'], autopct='%1.1f%%', colors=['#ff9999','#66b3ff','#99ff99'])
     plt.title('Customer Segmentation by Revenue')
     plt.tight_layout()
-    plt.savefig('viz_customer_segments.png')
+    plt.savefig(output_path)
     plt.close()
 
+def generate_visualizations(df, metrics):
+    print("\nGenerating Visualizations...")
+    
+    # Aggregate everything here, then render the independent charts in parallel
+    charts = []
+    
+    # 1. Revenue over time (Monthly)
+    # Month buckets are kept local (df is not modified): truncate to
+    # datetime64[M] and group on its integer months-since-epoch view. Rows
+    # without a date are left out, as the Period groupby did (NaT's integer
+    # view would otherwise become a real key)
+    months = df['Order Date'].to_numpy().astype('datetime64[M]')
+    has_date = ~np.isnat(months)
+    month_codes, month_keys = pd.factorize(months[has_date].view('i8'), sort=True)
+    month_labels = np.datetime_as_string(month_keys.astype('datetime64[M]'), unit='M')
+    charts.append((render_revenue_over_time, {
+        'Month': month_labels,
+        'Order Amount': np.bincount(month_codes, weights=df['Order Amount'].to_numpy()[has_date])
+    }, 'viz_revenue_over_time.png'))
+    
+    # 2. Top Product Categories
+    category_revenue = df.groupby('Category', observed=True, sort=False)['Order Amount'].sum().sort_values(ascending=False)
+    charts.append((render_category_revenue, {
+        'Category': category_revenue.index.astype(str).to_numpy(),
+        'Order Amount': category_revenue.to_numpy()
+    }, 'viz_category_revenue.png'))
+    
+    # 3. Order Amount Distribution
+    charts.append((render_order_distribution, {
+        'Order Amount': df['Order Amount'].to_numpy()
+    }, 'viz_order_distribution.png'))
+    
+    # --- New Visualizations ---
+    
+    # 4. Sales by Day of Week
+    # Histogram of weekday numbers (Monday=0), already in calendar order;
+    # orders without a date are skipped, as value_counts() did
+    days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    weekdays = df['Order Date'].dt.dayofweek
+    day_counts = np.bincount(weekdays[weekdays.notna()].to_numpy(dtype=np.int64), minlength=7)
+    charts.append((render_day_of_week, {
+        'Day': np.array(days_order),
+        'Orders': day_counts
+    }, 'viz_day_of_week.png'))
+    
+    # 5. Customer Segments (Pie Chart)
+    # Segment sizes come from calculate_metrics
+    charts.append((render_customer_segments, {
+        'Counts': np.array([metrics['High Value Count'], metrics['Medium Value Count'], metrics['Low Value Count']]),
+        'Labels': ['High Value', 'Medium Value', 'Low Value']
+    }, 'viz_customer_segments.png'))
+    
+    with ProcessPoolExecutor(max_workers=min(len(charts), os.cpu_count() or 1)) as executor:
+        futures = [executor.submit(render, data, output_path) for render, data, output_path in charts]
+        for future in futures:
+            future.result()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Customer behavior analysis")
+    parser.add_argument('--engine', choices=['pandas', 'polars'], default='pandas',
+                        help="Library used to load and clean the CSV (unused when a "
+                             "cleaned Parquet cache newer than the CSV exists)")
+    args = parser.parse_args()
+    if args.engine == 'polars' and pl is None:
+        parser.error("--engine polars requires the polars package")
+    
     if not os.path.exists('customer_transactions.csv'):
         print("Data file not found. Please run generate_data.py first.")
     else:
-        df = load_and_clean_data('customer_transactions.csv')
+        df = load_and_clean_data('customer_transactions.csv', engine=args.engine)
         metrics = calculate_metrics(df)
-        generate_visualizations(df)
+        generate_visualizations(df, metrics)
         print("\nAnalysis Complete. Visualizations saved.")